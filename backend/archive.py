@@ -0,0 +1,203 @@
+"""Archive old daily logs into monthly summaries and compressed cold storage
+
+Logs older than the horizon are rolled up into one DailyLogSummary row per
+user and month (what analytics, heatmaps and streaks need) and the raw rows
+are moved into DailyLogArchive as zlib-compressed JSON, then deleted from
+daily_logs. Whole months are archived at a time.
+
+Run from backend/, e.g. nightly from cron:
+    python archive.py --horizon-days 365
+"""
+from sqlalchemy import func, cast, Date, text
+from sqlalchemy.orm import Session, joinedload
+from datetime import date, timedelta
+from calendar import monthrange
+from uuid import UUID
+import argparse
+import json
+import os
+import zlib
+
+from database import SessionLocal
+from models import DailyLog, DailyLogSummary, DailyLogArchive
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+
+# Weekly/monthly analytics read the last 30 days straight from daily_logs
+MIN_HORIZON_DAYS = 60
+
+STATUSES = ['done', 'partial', 'missed', 'skipped', 'pending']
+
+def archive_cutoff(horizon_days: int, today: date = None) -> date:
+    """First day of the month containing today - horizon; older months get archived"""
+    if horizon_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"Horizon must be at least {MIN_HORIZON_DAYS} days")
+    oldest_kept = (today or date.today()) - timedelta(days=horizon_days)
+    return oldest_kept.replace(day=1)
+
+def next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def serialize_log(log: DailyLog) -> dict:
+    return {
+        "id": str(log.id),
+        "routine_task_id": str(log.routine_task_id),
+        "date": log.date.isoformat(),
+        "status": log.status,
+        "actual_minutes": log.actual_minutes or 0,
+        "notes": log.notes,
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+        # Snapshot of the task, so the summary can be rebuilt later
+        "category": log.routine_task.category if log.routine_task else None,
+        "planned_minutes": log.routine_task.planned_minutes if log.routine_task else 0,
+    }
+
+def load_archived_logs(archive: DailyLogArchive) -> list:
+    """Decompress the raw log rows stored in an archive"""
+    return json.loads(zlib.decompress(archive.payload))
+
+def summarize(rows: list, month: date) -> dict:
+    """Aggregate raw log rows for one month into DailyLogSummary fields"""
+    days = monthrange(month.year, month.month)[1]
+    counts = {status: 0 for status in STATUSES}
+    daily_total = [0] * days
+    daily_completed = [0] * days
+    category_breakdown = {}
+    actual_minutes = 0
+    planned_minutes = 0
+
+    for row in rows:
+        done = row["status"] == 'done'
+        day = date.fromisoformat(row["date"]).day - 1
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+        daily_total[day] += 1
+        daily_completed[day] += done
+        actual_minutes += row["actual_minutes"] or 0
+        planned_minutes += row["planned_minutes"] or 0
+        if row["category"]:
+            stats = category_breakdown.setdefault(row["category"], {'total': 0, 'completed': 0})
+            stats['total'] += 1
+            stats['completed'] += done
+
+    return {
+        "total": len(rows),
+        "completed": counts['done'],
+        "partial": counts['partial'],
+        "missed": counts['missed'],
+        "skipped": counts['skipped'],
+        "pending": counts['pending'],
+        "actual_minutes": actual_minutes,
+        "planned_minutes": planned_minutes,
+        "category_breakdown": category_breakdown,
+        "daily_total": daily_total,
+        "daily_completed": daily_completed,
+    }
+
+def store_month(db: Session, user_id: UUID, month: date, archive: DailyLogArchive, rows: list):
+    """Write a month's raw rows and rebuild its summary; no rows removes both"""
+    summary = db.query(DailyLogSummary).filter(
+        DailyLogSummary.user_id == user_id,
+        DailyLogSummary.month == month
+    ).first()
+    if not rows:
+        if archive:
+            db.delete(archive)
+        if summary:
+            db.delete(summary)
+        return
+
+    payload = zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 9)
+    if archive:
+        archive.payload = payload
+        archive.row_count = len(rows)
+    else:
+        db.add(DailyLogArchive(user_id=user_id, month=month, row_count=len(rows), payload=payload))
+
+    if not summary:
+        summary = DailyLogSummary(user_id=user_id, month=month)
+        db.add(summary)
+    for key, value in summarize(rows, month).items():
+        setattr(summary, key, value)
+
+def archive_month(db: Session, user_id: UUID, month: date) -> int:
+    """Move one user's logs for one month into summary + archive; returns rows moved
+
+    Logs written into an already archived month (e.g. back-filled entries)
+    are merged into the existing archive and the summary is rebuilt. Once
+    archived, a (routine task, date) is no longer covered by the daily_logs
+    unique constraint, so a back-filled log replaces the archived one.
+    """
+    logs = db.query(DailyLog).options(joinedload(DailyLog.routine_task)).filter(
+        DailyLog.user_id == user_id,
+        DailyLog.date >= month,
+        DailyLog.date < next_month(month)
+    ).all()
+    if not logs:
+        return 0
+
+    archive = db.query(DailyLogArchive).filter(
+        DailyLogArchive.user_id == user_id,
+        DailyLogArchive.month == month
+    ).first()
+    rows = {}
+    for row in (load_archived_logs(archive) if archive else []):
+        rows[(row["routine_task_id"], row["date"])] = row
+    for log in logs:
+        row = serialize_log(log)
+        rows[(row["routine_task_id"], row["date"])] = row
+    store_month(db, user_id, month, archive, list(rows.values()))
+
+    # Bulk delete: skips ORM events, so no per-row change notifications.
+    # Archived rows aren't deletions as far as /sync clients are concerned,
+    # so tell the tombstone trigger (migration 003) to skip them.
+    db.execute(text("SET LOCAL habit.archiving = 'on'"))
+    db.query(DailyLog).filter(
+        DailyLog.id.in_([log.id for log in logs])
+    ).delete(synchronize_session=False)
+    db.commit()
+    return len(logs)
+
+def purge_routine_task(db: Session, user_id: UUID, routine_task_id: UUID) -> int:
+    """Drop a deleted routine task's archived logs and rebuild the affected summaries
+
+    The ON DELETE CASCADE only reaches daily_logs. Call this in the same
+    transaction as the delete; returns archived rows removed.
+    """
+    task_id = str(routine_task_id)
+    removed = 0
+    for archive in db.query(DailyLogArchive).filter(DailyLogArchive.user_id == user_id).all():
+        rows = load_archived_logs(archive)
+        kept = [row for row in rows if row["routine_task_id"] != task_id]
+        if len(kept) != len(rows):
+            removed += len(rows) - len(kept)
+            store_month(db, user_id, archive.month, archive, kept)
+    return removed
+
+def archive_logs(db: Session, horizon_days: int = ARCHIVE_HORIZON_DAYS) -> dict:
+    """Archive every user's logs from months entirely older than the horizon"""
+    cutoff = archive_cutoff(horizon_days)
+    month_start = cast(func.date_trunc('month', DailyLog.date), Date)
+    pending = db.query(DailyLog.user_id, month_start).filter(
+        DailyLog.date < cutoff
+    ).distinct().order_by(DailyLog.user_id, month_start).all()
+
+    moved = 0
+    for user_id, month in pending:
+        moved += archive_month(db, user_id, month)
+
+    return {"cutoff": cutoff.isoformat(), "months": len(pending), "logs": moved}
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old daily logs into monthly summaries")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = archive_logs(db, args.horizon_days)
+    finally:
+        db.close()
+    print(f"Archived {result['logs']} logs across {result['months']} user-months older than {result['cutoff']}")
+
+if __name__ == "__main__":
+    main()
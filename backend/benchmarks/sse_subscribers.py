@@ -0,0 +1,173 @@
+"""Benchmark: concurrent /events subscribers held by one worker
+
+Default mode opens N idle SSE streams (the real routers.events.event_stream
+generator) on one event loop, then measures the in-process cost of each
+subscriber (its queue and generator, with no connection) and how long one
+notification takes to fan out to all of them. The Postgres hop is left
+out: each worker receives one NOTIFY per change regardless of how many
+subscribers it holds, so fan-out is the part that scales with N.
+
+--http starts a real uvicorn worker and holds N open HTTP connections to
+/events/{user_id}, so the numbers include the transport, the HTTP parser
+state and each StreamingResponse's tasks. It reports the worker's RSS growth
+per connection and end-to-end fan-out of one NOTIFY per user through
+Postgres. Needs the database settings of the app and Linux (/proc).
+
+Usage (from backend/):
+    python benchmarks/sse_subscribers.py --subscribers 1000 5000 10000
+    python benchmarks/sse_subscribers.py --http --subscribers 1000 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from notifications import EventHub
+from routers import events
+
+class IdleRequest:
+    """Stand-in for a connected client's Request"""
+    async def is_disconnected(self):
+        return False
+
+class OfflineHub(EventHub):
+    """EventHub without the LISTEN connection"""
+    def _ensure_listening(self):
+        pass
+
+async def run(subscribers: int, users: int):
+    hub = OfflineHub()
+    events.hub = hub
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+
+    streams = []
+    for i in range(subscribers):
+        stream = events.event_stream(IdleRequest(), user_ids[i % users])
+        await stream.__anext__()  # "retry:" preamble, subscribes the queue
+        streams.append(stream)
+    pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+    await asyncio.sleep(0)
+
+    subscribe_seconds = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        hub.dispatch({"user_id": user_id, "table": "daily_logs", "action": "updated", "id": str(uuid.uuid4())})
+    await asyncio.gather(*pending)
+    fanout_seconds = time.perf_counter() - started
+
+    for stream in streams:
+        await stream.aclose()
+
+    print(
+        f"{subscribers:>7} subscribers / {users:>6} users: "
+        f"subscribe {subscribe_seconds * 1000:8.1f} ms, "
+        f"{allocated / subscribers / 1024:6.2f} KiB in-process each (no connection), "
+        f"fan-out {fanout_seconds * 1000:8.1f} ms "
+        f"({fanout_seconds / subscribers * 1e6:5.2f} us per delivery)"
+    )
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError("VmRSS not found")
+
+def start_worker(port: int) -> subprocess.Popen:
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log", "--timeout-graceful-shutdown", "5"],
+        cwd=BACKEND_DIR
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        if worker.poll() is not None:
+            sys.exit(f"uvicorn exited with status {worker.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            break
+        except OSError:
+            time.sleep(0.1)
+    time.sleep(1)  # let the hub's LISTEN connection come up
+    return worker
+
+async def open_stream(port: int, user_id: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /events/{user_id} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    await reader.readuntil(b"retry: 3000\n\n")
+    return reader, writer
+
+async def run_http(subscribers: int, users: int, port: int):
+    from sqlalchemy import text
+    from database import engine
+    from notifications import CHANNEL
+
+    worker = start_worker(port)
+    try:
+        user_ids = [str(uuid.uuid4()) for _ in range(users)]
+        baseline = rss_kib(worker.pid)
+
+        started = time.perf_counter()
+        streams = []
+        for offset in range(0, subscribers, 500):
+            batch = range(offset, min(offset + 500, subscribers))
+            streams += await asyncio.gather(*(open_stream(port, user_ids[i % users]) for i in batch))
+        subscribe_seconds = time.perf_counter() - started
+        await asyncio.sleep(1)
+        grown = rss_kib(worker.pid) - baseline
+
+        started = time.perf_counter()
+        received = asyncio.gather(*(reader.readuntil(b"event: updated") for reader, _ in streams))
+        with engine.begin() as conn:
+            for user_id in user_ids:
+                payload = {"user_id": user_id, "table": "daily_logs", "action": "updated", "id": str(uuid.uuid4())}
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(payload)})
+        await received
+        fanout_seconds = time.perf_counter() - started
+
+        for _, writer in streams:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for _, writer in streams), return_exceptions=True)
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    print(
+        f"{subscribers:>7} connections / {users:>6} users: "
+        f"connect {subscribe_seconds * 1000:8.1f} ms, "
+        f"worker RSS +{grown / subscribers:6.2f} KiB per connection, "
+        f"NOTIFY to client {fanout_seconds * 1000:8.1f} ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--devices-per-user", type=int, default=2)
+    parser.add_argument("--http", action="store_true", help="hold real connections to a uvicorn worker")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    for subscribers in args.subscribers:
+        users = max(1, subscribers // args.devices_per_user)
+        if args.http:
+            asyncio.run(run_http(subscribers, users, args.port))
+        else:
+            asyncio.run(run(subscribers, users))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: per-worker time-to-first-request for the production server profile
+
+Launches `gunicorn main:app` with gunicorn.conf.py and keeps concurrent
+requests coming until every worker has answered one. For each worker it
+reports when it logged ready (app loaded + DB pool warmed) and when it
+answered its first request, both from launch and from its own fork. Needs
+the same database settings as the app.
+
+Usage (from backend/):
+    python benchmarks/startup.py --workers 4
+    python benchmarks/startup.py --workers 4 --no-preload
+"""
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_LINE = re.compile(r"Worker (\d+) ready in ([\d.]+)s \(warmed (\d+) DB connections\)")
+FIRST_REQUEST_LINE = re.compile(r"Worker (\d+) answered its first request ([\d.]+)s after fork")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-preload", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=None, help="client threads (default 4 per worker)")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(args.workers),
+        BIND=f"127.0.0.1:{args.port}",
+        PRELOAD_APP="false" if args.no_preload else "true",
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+    ready = {}  # pid -> (seconds since launch, seconds since fork, warmed connections)
+    first_request = {}  # pid -> (seconds since launch, seconds since fork)
+    def read_log():
+        for line in server.stderr:
+            now = time.perf_counter() - started
+            match = READY_LINE.search(line)
+            if match:
+                ready[int(match[1])] = (now, float(match[2]), int(match[3]))
+            match = FIRST_REQUEST_LINE.search(line)
+            if match:
+                first_request[int(match[1])] = (now, float(match[2]))
+    threading.Thread(target=read_log, daemon=True).start()
+
+    done = threading.Event()
+    def send_requests():
+        # A new connection per request, so the kernel spreads them over workers
+        while not done.is_set():
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{args.port}/", timeout=1).read()
+            except OSError:
+                time.sleep(0.01)
+    clients = [threading.Thread(target=send_requests, daemon=True) for _ in range(args.concurrency or 4 * args.workers)]
+    for client in clients:
+        client.start()
+
+    try:
+        while time.perf_counter() - started < args.timeout:
+            if server.poll() is not None:
+                sys.exit(f"gunicorn exited with status {server.returncode}")
+            if len(first_request) >= args.workers:
+                break
+            time.sleep(0.02)
+    finally:
+        done.set()
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    print(f"{args.workers} workers, preload {'off' if args.no_preload else 'on'}")
+    for pid in sorted(ready, key=lambda pid: ready[pid][0]):
+        since_launch, since_fork, warmed = ready[pid]
+        line = f"  worker {pid:>7}: ready {since_launch:6.3f}s after launch ({since_fork:.3f}s after fork, {warmed} DB connections)"
+        if pid in first_request:
+            line += ", first request {:6.3f}s after launch ({:.3f}s after fork)".format(*first_request[pid])
+        else:
+            line += ", no request answered before timeout"
+        print(line)
+    if len(ready) < args.workers:
+        print(f"  only {len(ready)} of {args.workers} workers became ready before timeout")
+
+if __name__ == "__main__":
+    main()
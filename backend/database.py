@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
+import time
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,6 +22,43 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+class PoolWaitMonitor:
+    """Smoothed time sessions spend waiting to check out a pooled connection
+
+    Used for load shedding (ratelimit.py). Readings older than max_age
+    count as zero, so a quiet period clears a past spike.
+    """
+
+    def __init__(self, alpha: float = 0.2, max_age: float = 5.0):
+        self.alpha = alpha
+        self.max_age = max_age
+        self.average = 0.0
+        self.updated = 0.0
+
+    def observe(self, seconds: float):
+        self.average += self.alpha * (seconds - self.average)
+        self.updated = time.monotonic()
+
+    def current(self) -> float:
+        if time.monotonic() - self.updated > self.max_age:
+            return 0.0
+        return self.average
+
+pool_wait = PoolWaitMonitor()
+
+# A session's transaction starts just before it checks out a connection and
+# begins just after, so the gap between the two is the pool wait
+@event.listens_for(SessionLocal, "after_transaction_create")
+def _mark_checkout_start(session, transaction):
+    if transaction.parent is None:
+        session.info["checkout_started"] = time.perf_counter()
+
+@event.listens_for(SessionLocal, "after_begin")
+def _record_pool_wait(session, transaction, connection):
+    started = session.info.pop("checkout_started", None)
+    if started is not None:
+        pool_wait.observe(time.perf_counter() - started)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,71 @@
+"""Production server profile, picked up automatically by `gunicorn main:app`
+
+Every setting can be overridden with an environment variable (see README).
+"""
+import multiprocessing
+import os
+import time
+
+from sqlalchemy import text
+
+# ============================================================================
+# Workers
+# ============================================================================
+# Async workers: one per core is enough, since each holds many requests.
+# See workers.py for how they shut down within graceful_timeout.
+worker_class = "workers.GracefulUvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# Import main:app once in the master so workers share its pages copy-on-write
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Recycle each worker after ~N requests to cap memory growth; the jitter
+# keeps workers from all restarting at the same moment
+max_requests = int(os.getenv("MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# On SIGTERM / recycle, stop accepting and give in-flight requests this long
+# (must stay below timeout, or the arbiter kills draining workers)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# How many pooled DB connections each worker opens before taking traffic
+warm_connections = int(os.getenv("WARM_DB_CONNECTIONS", "2"))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+
+# Proxies whose X-Forwarded-For is trusted. Behind a load balancer (e.g.
+# Render) set this to its addresses or "*", otherwise every request appears
+# to come from the proxy and per-address rate limits are shared by everyone.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# ============================================================================
+# Hooks
+# ============================================================================
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+    # Connections opened by the master during preload must not be shared
+    from database import engine
+    engine.dispose(close=False)
+
+def post_worker_init(worker):
+    """Warm the connection pool; runs after the app loads, before accepting"""
+    from database import engine
+
+    count = min(warm_connections, engine.pool.size())
+    connections = [engine.connect() for _ in range(count)]
+    for conn in connections:
+        conn.execute(text("SELECT 1"))
+    for conn in connections:
+        conn.close()  # back to the pool, still open
+
+    worker.log.info(
+        "Worker %s ready in %.3fs (warmed %d DB connections)",
+        worker.pid, time.perf_counter() - worker.forked_at, count
+    )
+
+def worker_exit(server, worker):
+    from database import engine
+    engine.dispose()
@@ -0,0 +1,98 @@
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
+import hashlib
+import time
+
+from database import engine, get_db
+from models import IdempotencyRecord
+
+# How long a key (and its stored response) can be replayed
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# Expired keys are purged by whichever request first notices this has elapsed
+EVICTION_INTERVAL_SECONDS = 600
+_last_eviction = 0.0
+
+class IdempotentRequest:
+    """Idempotency state for one create/batch request
+
+    Routes return `replay` as-is when it is set. Otherwise they do their
+    writes, call save() with the response before db.commit(), and the key
+    and the writes are committed together.
+    """
+
+    def __init__(self, db: Session, key: Optional[str], replay: Optional[JSONResponse] = None):
+        self.db = db
+        self.key = key
+        self.replay = replay
+
+    def save(self, response):
+        if self.key is None:
+            return
+        self.db.query(IdempotencyRecord).filter(IdempotencyRecord.key == self.key).update(
+            {"response": jsonable_encoder(response)}, synchronize_session=False
+        )
+
+async def request_fingerprint(request: Request) -> str:
+    """Hash of method, path and body, so a key can't be reused for a different request"""
+    body = await request.body()
+    return hashlib.sha256(request.method.encode() + request.url.path.encode() + b"\n" + body).hexdigest()
+
+def evict_expired_keys():
+    global _last_eviction
+    now = time.monotonic()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+    with engine.begin() as conn:
+        conn.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < datetime.utcnow()))
+
+def idempotency_key(
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    fingerprint: str = Depends(request_fingerprint),
+    db: Session = Depends(get_db)
+) -> IdempotentRequest:
+    """Dependency for create/batch endpoints honouring an Idempotency-Key header
+
+    The key is claimed with an INSERT in the request's own transaction.
+    A concurrent duplicate (from any worker) blocks on that row until the
+    first request commits, then replays its response; if the first request
+    fails and rolls back, the duplicate claims the key and runs instead.
+    """
+    if idempotency_key is None:
+        return IdempotentRequest(db, None)
+
+    evict_expired_keys()
+
+    now = datetime.utcnow()
+    stmt = insert(IdempotencyRecord).values(
+        key=idempotency_key,
+        fingerprint=fingerprint,
+        expires_at=now + IDEMPOTENCY_TTL
+    )
+    # An expired key that hasn't been evicted yet can be claimed again
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyRecord.key],
+        set_={"fingerprint": fingerprint, "response": None, "expires_at": now + IDEMPOTENCY_TTL},
+        where=IdempotencyRecord.expires_at < now
+    ).returning(IdempotencyRecord.key)
+
+    if db.execute(stmt).first():
+        return IdempotentRequest(db, idempotency_key)
+
+    record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == idempotency_key).first()
+    if record is not None and record.fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if record is None or record.response is None:
+        # Evicted between our INSERT and SELECT; the client's next retry claims it
+        raise HTTPException(status_code=409, detail="Idempotency-Key is being processed, retry shortly", headers={"Retry-After": "1"})
+    return IdempotentRequest(
+        db, None,
+        replay=JSONResponse(content=record.response, headers={"Idempotent-Replayed": "true"})
+    )
@@ -1,13 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import Base, engine
+from notifications import hub
+import profiler
+import ratelimit
 
-from routers import users, routine_tasks, logs, interviews, analytics
+from routers import users, routine_tasks, logs, interviews, analytics, sync, events, admin
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # LISTEN for other workers' cache invalidations (and /events changes)
+    hub.start()
+    yield
+    hub.close()
 
 app = FastAPI(
     title="Habit Tracker API",
     description="Comprehensive routine tracking, daily logging, analytics, and interview management system",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS (Cross-Origin Resource Sharing) for frontend access
@@ -19,6 +31,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count in-flight requests so expensive endpoints can be shed under load
+app.add_middleware(ratelimit.InFlightMiddleware)
+
+# Opt-in production profiling (only when PROFILER_TOKEN is set)
+if profiler.ENABLED:
+    app.add_middleware(profiler.ProfilerMiddleware)
+
 # Create tables automatically (will only create if they don't exist)
 Base.metadata.create_all(bind=engine)
 
@@ -28,6 +47,10 @@ app.include_router(routine_tasks.router)
 app.include_router(logs.router)
 app.include_router(interviews.router)
 app.include_router(analytics.router)
+app.include_router(sync.router)
+app.include_router(events.router)
+if profiler.ENABLED:
+    app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
@@ -36,5 +59,5 @@ def read_root():
         "message": "Habit Tracker API is running",
         "version": "2.0.0",
         "docs": "/docs",
-        "modules": ["users", "routine-tasks", "daily-logs", "interviews", "analytics"]
+        "modules": ["users", "routine-tasks", "daily-logs", "interviews", "analytics", "sync", "events"]
     }
\ No newline at end of file
@@ -0,0 +1,43 @@
+-- Migration: Indexable weekday schedule for routine tasks
+-- Date: 2026-10-19
+-- Description:
+--   - Add active_days_mask, a 7-bit weekday mask generated from active_days
+--     (Monday = 1, Tuesday = 2, ... Sunday = 64)
+--   - Add one partial index per weekday so "tasks for user X on Tuesday" and
+--     "all tasks on Tuesday" are index scans instead of full table scans
+
+-- =============================================================================
+-- STEP 1: Add the generated mask column
+-- =============================================================================
+-- Existing rows are backfilled from active_days when the column is added, and
+-- Postgres keeps it in sync on every insert/update afterwards.
+ALTER TABLE routine_tasks
+ADD COLUMN IF NOT EXISTS active_days_mask INTEGER GENERATED ALWAYS AS (
+    (CASE WHEN 'Monday' = ANY(active_days) THEN 1 ELSE 0 END)
+  | (CASE WHEN 'Tuesday' = ANY(active_days) THEN 2 ELSE 0 END)
+  | (CASE WHEN 'Wednesday' = ANY(active_days) THEN 4 ELSE 0 END)
+  | (CASE WHEN 'Thursday' = ANY(active_days) THEN 8 ELSE 0 END)
+  | (CASE WHEN 'Friday' = ANY(active_days) THEN 16 ELSE 0 END)
+  | (CASE WHEN 'Saturday' = ANY(active_days) THEN 32 ELSE 0 END)
+  | (CASE WHEN 'Sunday' = ANY(active_days) THEN 64 ELSE 0 END)
+) STORED;
+
+-- =============================================================================
+-- STEP 2: Partial indexes per weekday
+-- =============================================================================
+-- The WHERE clauses must match models.runs_on() exactly for the planner to
+-- pick them up: (active_days_mask & <bit>) <> 0
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_monday ON routine_tasks(user_id) WHERE (active_days_mask & 1) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_tuesday ON routine_tasks(user_id) WHERE (active_days_mask & 2) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_wednesday ON routine_tasks(user_id) WHERE (active_days_mask & 4) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_thursday ON routine_tasks(user_id) WHERE (active_days_mask & 8) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_friday ON routine_tasks(user_id) WHERE (active_days_mask & 16) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_saturday ON routine_tasks(user_id) WHERE (active_days_mask & 32) <> 0;
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_sunday ON routine_tasks(user_id) WHERE (active_days_mask & 64) <> 0;
+
+ANALYZE routine_tasks;
+
+-- =============================================================================
+-- MIGRATION COMPLETE
+-- =============================================================================
+-- Run this SQL in your Supabase SQL Editor
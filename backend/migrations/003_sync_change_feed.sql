@@ -0,0 +1,148 @@
+-- Migration: Change feed for incremental client sync
+-- Date: 2026-10-19
+-- Description:
+--   - Add a global change_seq sequence and a change_seq column on every
+--     synced table (routine_tasks, daily_logs, interviews, user_goals)
+--   - Assign change_seq on every insert/update under a per-user lock, so a
+--     user's change_seq values become visible in order
+--   - Record deletes (including cascades) in sync_tombstones
+--   - Index (user_id, change_seq) so GET /sync/{user_id}?since= is a range scan
+--   - Track how far old tombstones have been pruned (sync_state)
+--
+-- Safe to re-run; re-run it if you applied an earlier version of this file.
+
+-- =============================================================================
+-- STEP 1: Create the change sequence and tombstones table
+-- =============================================================================
+CREATE SEQUENCE IF NOT EXISTS change_seq;
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+  change_seq BIGINT PRIMARY KEY DEFAULT nextval('change_seq'),
+  table_name TEXT NOT NULL,
+  row_id UUID NOT NULL,
+  user_id UUID NOT NULL,  -- no FK: deleting a user also tombstones their rows
+  deleted_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user_seq ON sync_tombstones(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+-- 'tombstones_pruned_through': highest change_seq of a pruned tombstone.
+-- Sync tokens below it are rejected with 410 (see routers/sync.py).
+CREATE TABLE IF NOT EXISTS sync_state (
+  name TEXT PRIMARY KEY,
+  value BIGINT NOT NULL
+);
+
+-- =============================================================================
+-- STEP 2: Add change_seq to synced tables (existing rows get a value each)
+-- =============================================================================
+ALTER TABLE routine_tasks ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+ALTER TABLE interviews ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+ALTER TABLE user_goals ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+
+CREATE INDEX IF NOT EXISTS idx_routine_tasks_user_seq ON routine_tasks(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_daily_logs_user_seq ON daily_logs(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_interviews_user_seq ON interviews(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_user_goals_user_seq ON user_goals(user_id, change_seq);
+
+-- =============================================================================
+-- STEP 3: Assign change_seq on insert and update, in commit order per user
+-- =============================================================================
+-- nextval() is handed out at write time but rows only become visible at
+-- commit, so two overlapping transactions could commit out of order and a
+-- client syncing in between would move its token past the slower one's
+-- rows. Taking a per-user lock (held until commit) before nextval means a
+-- user's synced rows are written by one transaction at a time, so their
+-- change_seq values always become visible in increasing order.
+-- This also overrides values sent by the API, and covers edits made
+-- directly in the Supabase editor or SQL scripts.
+CREATE OR REPLACE FUNCTION lock_user_changes(uid UUID)
+RETURNS VOID AS $$
+BEGIN
+   PERFORM pg_advisory_xact_lock(hashtext('change_seq'), hashtext(uid::text));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_change_seq()
+RETURNS TRIGGER AS $$
+BEGIN
+   PERFORM lock_user_changes(NEW.user_id);
+   NEW.change_seq = nextval('change_seq');
+   RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_routine_tasks_change_seq ON routine_tasks;
+CREATE TRIGGER bump_routine_tasks_change_seq
+BEFORE INSERT OR UPDATE ON routine_tasks
+FOR EACH ROW
+EXECUTE FUNCTION bump_change_seq();
+
+DROP TRIGGER IF EXISTS bump_daily_logs_change_seq ON daily_logs;
+CREATE TRIGGER bump_daily_logs_change_seq
+BEFORE INSERT OR UPDATE ON daily_logs
+FOR EACH ROW
+EXECUTE FUNCTION bump_change_seq();
+
+DROP TRIGGER IF EXISTS bump_interviews_change_seq ON interviews;
+CREATE TRIGGER bump_interviews_change_seq
+BEFORE INSERT OR UPDATE ON interviews
+FOR EACH ROW
+EXECUTE FUNCTION bump_change_seq();
+
+DROP TRIGGER IF EXISTS bump_user_goals_change_seq ON user_goals;
+CREATE TRIGGER bump_user_goals_change_seq
+BEFORE INSERT OR UPDATE ON user_goals
+FOR EACH ROW
+EXECUTE FUNCTION bump_change_seq();
+
+-- =============================================================================
+-- STEP 4: Write a tombstone for every deleted row
+-- =============================================================================
+-- Row-level triggers also fire for ON DELETE CASCADE, so deleting a routine
+-- task tombstones its daily logs as well. Same per-user lock as STEP 3.
+-- archive.py sets habit.archiving for its transaction: rows moved to cold
+-- storage are not deletions, so sync clients keep their copies.
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+   IF current_setting('habit.archiving', true) = 'on' THEN
+      RETURN OLD;
+   END IF;
+   PERFORM lock_user_changes(OLD.user_id);
+   INSERT INTO sync_tombstones (table_name, row_id, user_id)
+   VALUES (TG_TABLE_NAME, OLD.id, OLD.user_id);
+   RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tombstone_routine_tasks ON routine_tasks;
+CREATE TRIGGER tombstone_routine_tasks
+AFTER DELETE ON routine_tasks
+FOR EACH ROW
+EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS tombstone_daily_logs ON daily_logs;
+CREATE TRIGGER tombstone_daily_logs
+AFTER DELETE ON daily_logs
+FOR EACH ROW
+EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS tombstone_interviews ON interviews;
+CREATE TRIGGER tombstone_interviews
+AFTER DELETE ON interviews
+FOR EACH ROW
+EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS tombstone_user_goals ON user_goals;
+CREATE TRIGGER tombstone_user_goals
+AFTER DELETE ON user_goals
+FOR EACH ROW
+EXECUTE FUNCTION record_sync_tombstone();
+
+-- =============================================================================
+-- MIGRATION COMPLETE
+-- =============================================================================
+-- Run this SQL in your Supabase SQL Editor
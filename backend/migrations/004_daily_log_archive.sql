@@ -0,0 +1,65 @@
+-- Migration: Archive old daily logs
+-- Date: 2026-10-19
+-- Description:
+--   - Create daily_log_summaries: one rollup row per user per month
+--   - Create daily_log_archives: raw logs per user per month, zlib-compressed
+--   - Populated by backend/archive.py, which then deletes the raw rows from
+--     daily_logs
+
+-- =============================================================================
+-- STEP 1: Create daily_log_summaries table
+-- =============================================================================
+CREATE TABLE IF NOT EXISTS daily_log_summaries (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  month DATE NOT NULL,  -- first day of the month
+  total INTEGER DEFAULT 0,
+  completed INTEGER DEFAULT 0,
+  partial INTEGER DEFAULT 0,
+  missed INTEGER DEFAULT 0,
+  skipped INTEGER DEFAULT 0,
+  pending INTEGER DEFAULT 0,
+  actual_minutes INTEGER DEFAULT 0,
+  planned_minutes INTEGER DEFAULT 0,
+  category_breakdown JSONB DEFAULT '{}',  -- e.g., {"Fitness": {"total": 20, "completed": 15}}
+  daily_total INTEGER[] DEFAULT '{}',  -- one entry per day of the month
+  daily_completed INTEGER[] DEFAULT '{}',
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW(),
+  UNIQUE(user_id, month)  -- Also serves (user_id, month range) lookups
+);
+
+-- =============================================================================
+-- STEP 2: Create daily_log_archives table
+-- =============================================================================
+CREATE TABLE IF NOT EXISTS daily_log_archives (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  month DATE NOT NULL,  -- first day of the month
+  row_count INTEGER DEFAULT 0,
+  payload BYTEA NOT NULL,  -- zlib-compressed JSON array of daily_logs rows
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW(),
+  UNIQUE(user_id, month)
+);
+
+-- Payloads are already compressed; skip TOAST's own compression attempt
+ALTER TABLE daily_log_archives ALTER COLUMN payload SET STORAGE EXTERNAL;
+
+-- =============================================================================
+-- STEP 3: Triggers for updated_at timestamp
+-- =============================================================================
+CREATE TRIGGER update_daily_log_summaries_updated_at
+BEFORE UPDATE ON daily_log_summaries
+FOR EACH ROW
+EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_daily_log_archives_updated_at
+BEFORE UPDATE ON daily_log_archives
+FOR EACH ROW
+EXECUTE FUNCTION update_updated_at_column();
+
+-- =============================================================================
+-- MIGRATION COMPLETE
+-- =============================================================================
+-- Run this SQL in your Supabase SQL Editor
@@ -0,0 +1,24 @@
+-- Migration: Idempotency keys for retry-safe writes
+-- Date: 2026-10-19
+-- Description:
+--   - Create idempotency_keys, which stores the response of each create/batch
+--     request sent with an Idempotency-Key header so retries replay it
+--   - Keys expire after 24 hours and are purged by the API (idempotency.py)
+
+-- =============================================================================
+-- STEP 1: Create idempotency_keys table
+-- =============================================================================
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,  -- sha256 of method, path and body
+  response JSONB,  -- null until the original request commits
+  expires_at TIMESTAMP NOT NULL
+);
+
+-- Add index for expiry purges
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+-- =============================================================================
+-- MIGRATION COMPLETE
+-- =============================================================================
+-- Run this SQL in your Supabase SQL Editor
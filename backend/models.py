@@ -1,10 +1,27 @@
-from sqlalchemy import Column, String, Date, ForeignKey, DateTime, Integer, ARRAY
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Date, ForeignKey, DateTime, Integer, BigInteger, LargeBinary, ARRAY, Computed, FetchedValue, Sequence
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 from database import Base
 
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def weekday_bit(day_name: str) -> int:
+    """Bit for a day name in RoutineTask.active_days_mask (Monday = 1, Sunday = 64)"""
+    return 1 << WEEKDAYS.index(day_name)
+
+# 7-bit weekday mask derived from active_days, kept in sync by Postgres
+ACTIVE_DAYS_MASK_SQL = " | ".join(
+    f"(CASE WHEN '{day}' = ANY(active_days) THEN {1 << i} ELSE 0 END)"
+    for i, day in enumerate(WEEKDAYS)
+)
+
+# Global, monotonic change counter used by the /sync change feed. Every insert
+# or update of a synced row takes the next value, assigned by the database
+# (migration 003's trigger), never by the application.
+CHANGE_SEQ = Sequence("change_seq", metadata=Base.metadata)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -26,8 +43,10 @@ class RoutineTask(Base):
     category = Column(String, nullable=False)  # Learning, Fitness, Rest, Other
     planned_minutes = Column(Integer, default=0)
     active_days = Column(ARRAY(String), default=[])  # ['Monday', 'Tuesday']
+    active_days_mask = Column(Integer, Computed(ACTIVE_DAYS_MASK_SQL, persisted=True))  # indexed per weekday, see migration 002
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, server_default=CHANGE_SEQ.next_value(), server_onupdate=FetchedValue(), nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="routine_tasks")
@@ -44,6 +63,7 @@ class DailyLog(Base):
     actual_minutes = Column(Integer, default=0)
     notes = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(BigInteger, server_default=CHANGE_SEQ.next_value(), server_onupdate=FetchedValue(), nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="daily_logs")
@@ -64,6 +84,7 @@ class Interview(Base):
     follow_up_date = Column(Date)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, server_default=CHANGE_SEQ.next_value(), server_onupdate=FetchedValue(), nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="interviews")
@@ -76,6 +97,70 @@ class UserGoal(Base):
     goal_type = Column(String, default='weekly')  # weekly, monthly
     target_percentage = Column(Integer, default=80)
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(BigInteger, server_default=CHANGE_SEQ.next_value(), server_onupdate=FetchedValue(), nullable=False)
 
     # Relationships
-    user = relationship("User", back_populates="user_goals")
\ No newline at end of file
+    user = relationship("User", back_populates="user_goals")
+
+class DailyLogSummary(Base):
+    """Per-user, per-month rollup of archived daily logs (see archive.py)"""
+    __tablename__ = "daily_log_summaries"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    month = Column(Date, nullable=False)  # first day of the month
+    total = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    partial = Column(Integer, default=0)
+    missed = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    pending = Column(Integer, default=0)
+    actual_minutes = Column(Integer, default=0)
+    planned_minutes = Column(Integer, default=0)
+    category_breakdown = Column(JSONB, default={})  # {'Fitness': {'total': 20, 'completed': 15}}
+    daily_total = Column(ARRAY(Integer), default=[])  # one entry per day of the month
+    daily_completed = Column(ARRAY(Integer), default=[])
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DailyLogArchive(Base):
+    """Raw daily logs for one user and month, as zlib-compressed JSON"""
+    __tablename__ = "daily_log_archives"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    month = Column(Date, nullable=False)  # first day of the month
+    row_count = Column(Integer, default=0)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdempotencyRecord(Base):
+    """Response stored for an Idempotency-Key, replayed for retried requests"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)  # sha256 of method, path and body
+    response = Column(JSONB)  # null until the original request commits
+    expires_at = Column(DateTime, nullable=False)
+
+class SyncTombstone(Base):
+    """Record of a deleted synced row, written by the delete triggers in migration 003"""
+    __tablename__ = "sync_tombstones"
+
+    change_seq = Column(BigInteger, CHANGE_SEQ, primary_key=True)
+    table_name = Column(String, nullable=False)  # routine_tasks, daily_logs, interviews, user_goals
+    row_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)  # no FK: the user may be gone too
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+class SyncState(Base):
+    """Named counters for the change feed (see migration 003)"""
+    __tablename__ = "sync_state"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False)
+
+def runs_on(day_name: str):
+    """Filter for routine tasks active on day_name, matching the partial weekday indexes"""
+    return RoutineTask.active_days_mask.op('&')(weekday_bit(day_name)) != 0
@@ -0,0 +1,257 @@
+from collections import defaultdict
+from sqlalchemy import event, text
+import asyncio
+import json
+import logging
+import psycopg2
+
+from database import SessionLocal, engine
+from models import RoutineTask, DailyLog, Interview
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channels shared by every uvicorn worker
+CHANNEL = "habit_events"
+CACHE_CHANNEL = "habit_cache"
+
+# Models whose writes are pushed to /events subscribers
+NOTIFY_MODELS = {
+    RoutineTask: "routine_tasks",
+    DailyLog: "daily_logs",
+    Interview: "interviews",
+}
+
+# ============================================================================
+# Publishing: NOTIFY from the write paths
+# ============================================================================
+@event.listens_for(SessionLocal, "after_flush")
+def publish_changes(session, flush_context):
+    """Queue a NOTIFY for every tracked row written in this flush
+
+    NOTIFY is transactional, so listeners only hear about a change once the
+    router's db.commit() succeeds, and never about a rolled-back one.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+
+    changes = []
+    for action, objects in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            table = NOTIFY_MODELS.get(type(obj))
+            if table is None:
+                continue
+            if action == "updated" and not session.is_modified(obj):
+                continue
+            changes.append({
+                "user_id": str(obj.user_id),
+                "table": table,
+                "action": action,
+                "id": str(obj.id),
+            })
+
+    for change in changes:
+        notify_change(session, change)
+
+def notify_change(session, change: dict):
+    """Queue one change for /events subscribers; used directly by writes that bypass the ORM"""
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": json.dumps(change)}
+    )
+
+# ============================================================================
+# Cache invalidation: per-worker caches kept coherent through NOTIFY
+# ============================================================================
+# cache name -> (drop(*key), clear())
+_caches = {}
+
+def register_cache(name: str, drop, clear):
+    """Register a per-worker cache so invalidate_cache() can reach it in every worker"""
+    _caches[name] = (drop, clear)
+
+def drop_cached(name: str, key):
+    entry = _caches.get(name)
+    if entry is not None:
+        entry[0](*key)
+
+def clear_caches():
+    for _, clear in _caches.values():
+        clear()
+
+def invalidate_cache(session, name: str, *key):
+    """Drop a cache entry in every worker once the session commits
+
+    Key parts must be JSON-serialisable. This worker drops the entry right
+    after commit; the others hear about it through NOTIFY on CACHE_CHANNEL.
+    """
+    session.info.setdefault("cache_invalidations", []).append((name, key))
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CACHE_CHANNEL, "payload": json.dumps({"cache": name, "key": key})}
+        )
+
+@event.listens_for(SessionLocal, "after_commit")
+def apply_cache_invalidations(session):
+    for name, key in session.info.pop("cache_invalidations", ()):
+        drop_cached(name, key)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def discard_cache_invalidations(session):
+    session.info.pop("cache_invalidations", None)
+
+# ============================================================================
+# Listening: one LISTEN connection per worker, fanned out to SSE subscribers
+# ============================================================================
+class EventHub:
+    """Fans out NOTIFY payloads to per-user asyncio queues and local caches
+
+    A single psycopg2 connection per worker LISTENs on CHANNEL and
+    CACHE_CHANNEL and is polled from the event loop via add_reader, so idle
+    subscribers cost one queue each and no threads. Connecting happens in
+    the default executor (with connect_timeout), so a slow or unreachable
+    database never stalls the event loop. start() is called when
+    the app starts, so cache invalidations arrive even with no subscribers.
+    """
+
+    def __init__(self, queue_size: int = 100, reconnect_delay: float = 5.0, connect_timeout: int = 5):
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.connect_timeout = connect_timeout
+        self._subscribers = defaultdict(set)
+        self._conn = None
+        self._fd = None
+        self._loop = None
+        self._connecting = None
+        self._retry = None
+        self._closing = False
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Queue of changes for user_id; a None item means the stream should end"""
+        self._ensure_listening()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._closing:
+            queue.put_nowait(None)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def dispatch(self, payload: dict):
+        """Deliver one change to every subscriber of its user"""
+        for queue in self._subscribers.get(payload.get("user_id"), ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to resync instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"user_id": payload["user_id"], "action": "resync"})
+
+    def start(self):
+        self._ensure_listening()
+
+    def _ensure_listening(self):
+        if engine.dialect.name != "postgresql":
+            return
+        if self._conn is not None or self._connecting is not None or self._retry is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._connecting = self._loop.create_task(self._connect())
+
+    def _open_connection(self):
+        """Blocking connect + LISTEN; run in the default executor, never on the loop"""
+        conn = psycopg2.connect(
+            engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+            connect_timeout=self.connect_timeout
+        )
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {CHANNEL}; LISTEN {CACHE_CHANNEL}")
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return conn
+
+    async def _connect(self):
+        try:
+            conn = await self._loop.run_in_executor(None, self._open_connection)
+        except psycopg2.Error:
+            logger.exception("Could not LISTEN on %s, retrying in %ss", CHANNEL, self.reconnect_delay)
+            self._retry = self._loop.call_later(self.reconnect_delay, self._reconnect)
+            return
+        finally:
+            self._connecting = None
+        self._conn = conn
+        self._fd = conn.fileno()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+        # Changes and invalidations may have been missed while not listening
+        clear_caches()
+        for user_id in list(self._subscribers):
+            self.dispatch({"user_id": user_id, "action": "resync"})
+
+    def _on_readable(self):
+        try:
+            self._conn.poll()
+        except psycopg2.Error:
+            logger.exception("Lost LISTEN connection on %s", CHANNEL)
+            self._drop_connection()
+            self._retry = self._loop.call_later(self.reconnect_delay, self._reconnect)
+            return
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                if notify.channel == CACHE_CHANNEL:
+                    drop_cached(payload["cache"], payload["key"])
+                else:
+                    self.dispatch(payload)
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Ignoring malformed notification: %r", notify.payload)
+
+    def _drop_connection(self):
+        if self._conn is None:
+            return
+        self._loop.remove_reader(self._fd)
+        try:
+            self._conn.close()
+        except psycopg2.Error:
+            pass
+        self._conn = None
+
+    def _reconnect(self):
+        self._retry = None
+        self._ensure_listening()
+
+    def shutdown(self):
+        """End every open stream; called when the worker starts shutting down
+
+        Clients reconnect (to another worker) using the SSE retry interval.
+        """
+        self._closing = True
+        for queues in self._subscribers.values():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def close(self):
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+        if self._connecting is not None:
+            self._connecting.cancel()
+            self._connecting = None
+        self._drop_connection()
+
+hub = EventHub()
@@ -0,0 +1,226 @@
+"""Opt-in sampling profiler for diagnosing slow endpoints in production
+
+Enabled only when PROFILER_TOKEN is set; otherwise nothing is installed and
+requests pay nothing. Callers must send the token in X-Profile-Token.
+
+- One request: add `X-Profile: 1` (or `?_profile=1`) to any request. The
+  response is replaced by that request's profile.
+- Everything for N seconds: POST /admin/profile?seconds=N (routers/admin.py).
+
+Profiles are flamegraph-compatible collapsed stacks (`frame;frame;frame count`).
+Time spent waiting on Postgres shows up as a `[sql] SELECT daily_logs` leaf
+frame, and is also totalled per statement using engine events.
+"""
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import event
+from urllib.parse import parse_qs
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+
+from database import engine
+
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+ENABLED = bool(PROFILER_TOKEN)
+
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of threads that are just waiting for work
+IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("selectors.py", "poll")}
+
+SQL_LABEL = re.compile(r"^\s*(\w+).*?\b(?:FROM|INTO|UPDATE)\s+([\w.\"]+)", re.IGNORECASE | re.DOTALL)
+
+def authorized(token: str) -> bool:
+    return ENABLED and token is not None and hmac.compare_digest(token, PROFILER_TOKEN)
+
+def sql_label(statement: str) -> str:
+    match = SQL_LABEL.match(statement)
+    if match:
+        return f"{match[1].upper()} {match[2]}"
+    return statement.split(None, 1)[0].upper() if statement.strip() else "SQL"
+
+class Profile:
+    """Samples thread stacks on a background thread until stop() is called
+
+    With request_scoped=True only the threads seen running this request's
+    SQL (plus the event loop thread) are kept, which is how a request's
+    threadpool thread is told apart from everyone else's.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, request_scoped: bool = False):
+        self.interval = interval
+        self.request_scoped = request_scoped
+        self.threads = set()
+        self.samples = defaultdict(Counter)  # thread id -> stack -> count
+        self.sql = defaultdict(lambda: [0, 0.0])  # statement -> [count, seconds]
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._elapsed = 0.0
+
+    def start(self):
+        if self.request_scoped:
+            self.threads.add(threading.get_ident())
+        self._started = time.perf_counter()
+        _active.add(self)
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        _active.discard(self)
+        self._elapsed = time.perf_counter() - self._started
+
+    def record_sql(self, statement: str, seconds: float):
+        entry = self.sql[statement]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                sql = _in_sql.get(thread_id)
+                if sql is not None:
+                    stack += ";[sql] " + sql[0]
+                self.samples[thread_id][stack] += 1
+
+    def _stack(self, frame):
+        names = []
+        leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        if leaf in IDLE_LEAVES:
+            return None
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self) -> str:
+        stacks = Counter()
+        for thread_id, counts in self.samples.items():
+            if self.request_scoped and thread_id not in self.threads:
+                continue
+            stacks.update(counts)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+    def result(self) -> dict:
+        collapsed = self.collapsed()
+        statements = sorted(self.sql.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "mode": "request" if self.request_scoped else "sampling",
+            "duration_ms": round(self._elapsed * 1000, 2),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(int(line.rsplit(" ", 1)[1]) for line in collapsed.splitlines()),
+            "sql": {
+                "statements": sum(count for count, _ in self.sql.values()),
+                "total_ms": round(sum(seconds for _, seconds in self.sql.values()) * 1000, 2),
+                "by_statement": [
+                    {"statement": statement, "count": count, "total_ms": round(seconds * 1000, 2)}
+                    for statement, (count, seconds) in statements
+                ]
+            },
+            "collapsed": collapsed
+        }
+
+    def response(self, fmt: str = "json", headers: dict = None):
+        if fmt == "collapsed":
+            return PlainTextResponse(self.collapsed(), headers=headers)
+        return JSONResponse(self.result(), headers=headers)
+
+# Profiles currently running, and the SQL each thread is waiting on
+_active = set()
+_in_sql = {}  # thread id -> (label, statement, start)
+_request_profile = ContextVar("request_profile", default=None)
+
+# ============================================================================
+# SQL attribution
+# ============================================================================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not _active:
+        return
+    thread_id = threading.get_ident()
+    profile = _request_profile.get()
+    if profile is not None:
+        profile.threads.add(thread_id)
+    _in_sql[thread_id] = (sql_label(statement), statement, time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    entry = _in_sql.pop(threading.get_ident(), None)
+    if entry is None:
+        return
+    _, statement, started = entry
+    seconds = time.perf_counter() - started
+    statement = " ".join(statement.split())[:300]
+    request_profile = _request_profile.get()
+    for profile in list(_active):
+        if not profile.request_scoped or profile is request_profile:
+            profile.record_sql(statement, seconds)
+
+if ENABLED:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# ============================================================================
+# Per-request profiling
+# ============================================================================
+class ProfilerMiddleware:
+    """ASGI middleware profiling requests sent with X-Profile or ?_profile
+
+    Only added to the app when ENABLED. Unflagged requests just pay a
+    header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        fmt = headers.get(b"x-profile", b"").decode()
+        if not fmt and b"_profile=" in scope["query_string"]:
+            fmt = parse_qs(scope["query_string"].decode()).get("_profile", [""])[0]
+        if not fmt:
+            return await self.app(scope, receive, send)
+
+        token = headers.get(b"x-profile-token", b"").decode() or None
+        if not authorized(token):
+            response = JSONResponse({"detail": "Invalid profiler token"}, status_code=403)
+            return await response(scope, receive, send)
+
+        status = {}
+        async def discard_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        profile = Profile(request_scoped=True)
+        context_token = _request_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, discard_send)
+        except Exception:
+            # Still worth returning the profile of a request that blew up
+            status.setdefault("code", 500)
+        finally:
+            profile.stop()
+            _request_profile.reset(context_token)
+
+        response = profile.response(
+            "collapsed" if fmt == "collapsed" else "json",
+            headers={"X-Profiled-Status": str(status.get("code", 500))}
+        )
+        await response(scope, receive, send)
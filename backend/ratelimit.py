@@ -0,0 +1,183 @@
+"""Per-user rate limiting and load shedding for expensive endpoints
+
+Expensive routes declare a cost class with `Depends(rate_limit("analytics"))`.
+Each (cost class, user) pair gets a token bucket; an empty bucket returns
+429 with Retry-After. Before that, if this worker is overloaded (too many
+requests in flight, or sessions queueing for a DB connection), expensive
+routes are shed with 503 + Retry-After so cheap ones stay fast.
+
+Buckets live in-process by default (limits are then per worker). Set
+RATE_LIMIT_REDIS_URL to share them across workers; that needs the optional
+`redis` package.
+"""
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from threading import Lock
+from uuid import UUID
+import logging
+import math
+import os
+import time
+
+from cache import TTLCache, MISSING
+from database import get_db, pool_wait
+
+logger = logging.getLogger(__name__)
+
+# cost class -> (burst capacity, tokens refilled per second)
+# Sized above normal UI use: each Analytics page view or weekly/monthly
+# toggle spends 2 analytics tokens (stats + streak), plus one per heatmap
+# revalidation, so a user clicking around quickly never sees a 429 while a
+# script hammering the aggregates is still held to about one query a second.
+COST_CLASSES = {
+    "analytics": (60, 1),  # aggregate queries over many logs
+    "bulk": (20, 30 / 60),  # unbounded lists of rows
+}
+
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "200"))
+SHED_POOL_WAIT_MS = float(os.getenv("SHED_POOL_WAIT_MS", "250"))
+SHED_RETRY_AFTER = 2  # seconds
+
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# Requests currently being handled by this worker (see InFlightMiddleware)
+in_flight = 0
+
+# ============================================================================
+# Token buckets
+# ============================================================================
+class LocalBuckets:
+    """Token buckets held in this process"""
+
+    def __init__(self, maxsize: int = 50000):
+        # Idle buckets refill to full, so evicting them loses nothing
+        self._buckets = TTLCache(maxsize=maxsize, ttl=3600)
+        self._lock = Lock()
+
+    def take(self, key, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is MISSING:
+                bucket = [capacity, now]
+                self._buckets.set(key, bucket)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis"""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.1)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity: float, rate: float) -> float:
+        try:
+            return float(self._script(keys=["ratelimit:" + ":".join(key)], args=[capacity, rate]))
+        except Exception:
+            # Fail open: a Redis outage shouldn't take the API down with it
+            logger.warning("Rate limit backend unavailable, allowing request", exc_info=True)
+            return 0.0
+
+buckets = RedisBuckets(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else LocalBuckets()
+
+# ============================================================================
+# Load shedding
+# ============================================================================
+def overloaded() -> bool:
+    return in_flight > SHED_MAX_IN_FLIGHT or pool_wait.current() * 1000 > SHED_POOL_WAIT_MS
+
+class InFlightMiddleware:
+    """ASGI middleware counting in-flight requests for load shedding
+
+    Long-lived /events streams are left out, as they are idle most of the time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http" or scope["path"].startswith("/events/"):
+            return await self.app(scope, receive, send)
+        in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight -= 1
+
+# ============================================================================
+# Dependency
+# ============================================================================
+def canonical_user(value):
+    """One spelling per user id (case, braces and hyphens vary), or None if not a UUID"""
+    if value is None:
+        return None
+    try:
+        return str(UUID(str(value)))
+    except ValueError:
+        return None
+
+def rate_limit(cost_class: str, owner=None):
+    """Dependency factory enforcing load shedding and a cost class's token bucket
+
+    Requests are keyed by the user_id path parameter. Routes without one can
+    pass owner(db, path_params) returning the user to charge; otherwise (the
+    get_all_* lists) they are keyed by client address. Behind a proxy that
+    needs FORWARDED_ALLOW_IPS (see gunicorn.conf.py).
+    """
+    capacity, rate = COST_CLASSES[cost_class]
+
+    def limiter(request: Request, db: Session = Depends(get_db)):
+        if overloaded():
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(SHED_RETRY_AFTER)}
+            )
+
+        # Path parameters aren't validated yet: bad ids fall back to the
+        # client address, and the route then answers 422
+        user = canonical_user(request.path_params.get("user_id"))
+        if user is None and owner is not None:
+            user = canonical_user(owner(db, request.path_params))
+        subject = f"user:{user}" if user else f"ip:{request.client.host if request.client else 'unknown'}"
+        wait = buckets.take((cost_class, subject), capacity, rate)
+        if wait > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+    return limiter
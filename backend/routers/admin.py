@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import Optional
+import asyncio
+
+import profiler
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.post("/profile")
+async def profile_all_requests(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(profiler.DEFAULT_INTERVAL * 1000, ge=1, le=100),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    x_profile_token: Optional[str] = Header(None)
+):
+    """Sample every request handled by this worker for N seconds
+
+    Requires X-Profile-Token. Returns collapsed stacks plus per-statement
+    SQL time (format=collapsed returns just the stacks, for flamegraph.pl
+    or speedscope). With several workers, each call profiles one of them.
+    """
+    if not profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+    profile = profiler.Profile(interval=interval_ms / 1000)
+    profile.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile.stop()
+    return profile.response(format)
@@ -1,14 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from uuid import UUID
 from datetime import date, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
+import hashlib
+import json
 
+from cache import TTLCache, MISSING
 from database import get_db
-from models import DailyLog, RoutineTask, UserGoal
+from notifications import invalidate_cache, register_cache
+from ratelimit import rate_limit
+from models import DailyLog, DailyLogSummary, RoutineTask, UserGoal
 
-router = APIRouter(prefix="/analytics", tags=["Analytics"])
+router = APIRouter(prefix="/analytics", tags=["Analytics"], dependencies=[Depends(rate_limit("analytics"))])
+
+# Weekly/monthly stats only cover the last 30 days, which archive.py never
+# touches (MIN_HORIZON_DAYS). Heatmap and streak also read archived months
+# from DailyLogSummary.
+
+# (payload, etag) keyed by (user_id, year). Log writes and cascading deletes
+# invalidate entries in every worker; the TTLs bound staleness if a worker
+# misses an invalidation. Past dates can still be logged, so no year is final.
+HEATMAP_CURRENT_YEAR_TTL = 300
+HEATMAP_PAST_YEAR_TTL = 3600
+heatmap_cache = TTLCache(maxsize=2048)
+
+def drop_heatmap(user_id: str, year: Optional[int] = None):
+    user_id = UUID(user_id)
+    if year is None:
+        heatmap_cache.discard_where(lambda key: key[0] == user_id)
+    else:
+        heatmap_cache.pop((user_id, year))
+
+register_cache("heatmap", drop_heatmap, heatmap_cache.clear)
+
+def invalidate_heatmap(db: Session, user_id: UUID, year: Optional[int] = None):
+    """Drop a user's cached heatmap for one year (or all years) once db commits"""
+    invalidate_cache(db, "heatmap", str(user_id), year)
+
+def completion_level(completed: int, total: int) -> int:
+    """Bucket a day's completion ratio into a 0-4 heatmap level"""
+    if total == 0 or completed == 0:
+        return 0
+    ratio = completed / total
+    if ratio < 0.25:
+        return 1
+    if ratio < 0.5:
+        return 2
+    if ratio < 0.75:
+        return 3
+    return 4
 
 @router.get("/weekly/{user_id}")
 def get_weekly_analytics(user_id: UUID, db: Session = Depends(get_db)):
@@ -226,6 +268,7 @@ def get_user_streak(user_id: UUID, db: Session = Depends(get_db)):
     today = date.today()
     streak = 0
     current_date = today
+    archived_months = {}  # first of month -> daily_completed from DailyLogSummary
 
     while True:
         logs = db.query(DailyLog).filter(
@@ -234,6 +277,18 @@ def get_user_streak(user_id: UUID, db: Session = Depends(get_db)):
             DailyLog.status == 'done'
         ).first()
 
+        if not logs:
+            # Fall back to the archived summary for this month, if any
+            month = current_date.replace(day=1)
+            if month not in archived_months:
+                summary = db.query(DailyLogSummary.daily_completed).filter(
+                    DailyLogSummary.user_id == user_id,
+                    DailyLogSummary.month == month
+                ).first()
+                archived_months[month] = summary.daily_completed if summary else None
+            daily_completed = archived_months[month]
+            logs = bool(daily_completed) and daily_completed[current_date.day - 1] > 0
+
         if logs:
             streak += 1
             current_date -= timedelta(days=1)
@@ -244,3 +299,90 @@ def get_user_streak(user_id: UUID, db: Session = Depends(get_db)):
         "current_streak": streak,
         "last_completed_date": (today if streak > 0 else None)
     }
+
+@router.get("/heatmap/{user_id}")
+def get_heatmap(
+    user_id: UUID,
+    response: Response,
+    year: Optional[int] = Query(None, ge=1970, le=9999),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Get a year of per-day completion data in a compact columnar form
+
+    Day i of the year is start + i days. `levels` packs one 0-4 completion
+    level per day into a string; `completed` and `total` are parallel arrays.
+    Responses carry an ETag; revalidating with If-None-Match returns 304.
+    """
+    today = date.today()
+    if year is None:
+        year = today.year
+    if year > today.year:
+        raise HTTPException(status_code=400, detail="Year cannot be in the future")
+
+    # Browsers keep the body but revalidate every time, which is cheap when cached here
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    cache_key = (user_id, year)
+    cached = heatmap_cache.get(cache_key)
+    if cached is MISSING:
+        payload = build_heatmap(db, user_id, year)
+        etag = '"' + hashlib.sha1(json.dumps(payload).encode()).hexdigest() + '"'
+        ttl = HEATMAP_CURRENT_YEAR_TTL if year == today.year else HEATMAP_PAST_YEAR_TTL
+        heatmap_cache.set(cache_key, (payload, etag), ttl=ttl)
+    else:
+        payload, etag = cached
+
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = etag
+    return payload
+
+def build_heatmap(db: Session, user_id: UUID, year: int) -> dict:
+
+    start = date(year, 1, 1)
+    end = date(year, 12, 31)
+    days = (end - start).days + 1
+
+    # One grouped query: per-day totals and completed counts for the year
+    rows = db.query(
+        DailyLog.date,
+        func.count(DailyLog.id),
+        func.count(DailyLog.id).filter(DailyLog.status == 'done')
+    ).filter(
+        DailyLog.user_id == user_id,
+        DailyLog.date >= start,
+        DailyLog.date <= end
+    ).group_by(DailyLog.date).all()
+
+    total = [0] * days
+    completed = [0] * days
+    for log_date, day_total, day_completed in rows:
+        index = (log_date - start).days
+        total[index] = day_total
+        completed[index] = day_completed
+
+    # Months moved out of daily_logs by archive.py
+    summaries = db.query(
+        DailyLogSummary.month,
+        DailyLogSummary.daily_total,
+        DailyLogSummary.daily_completed
+    ).filter(
+        DailyLogSummary.user_id == user_id,
+        DailyLogSummary.month >= start,
+        DailyLogSummary.month <= end
+    ).all()
+    for month, daily_total, daily_completed in summaries:
+        offset = (month - start).days
+        for day, (day_total, day_completed) in enumerate(zip(daily_total, daily_completed)):
+            total[offset + day] += day_total
+            completed[offset + day] += day_completed
+
+    return {
+        "year": year,
+        "start": start.isoformat(),
+        "days": days,
+        "levels": "".join(str(completion_level(c, t)) for c, t in zip(completed, total)),
+        "completed": completed,
+        "total": total
+    }
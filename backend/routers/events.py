@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from uuid import UUID
+import asyncio
+import json
+
+from notifications import hub
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# Comment line sent on idle streams so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+
+async def event_stream(request: Request, user_id: str):
+    queue = hub.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                change = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            if change is None:
+                break  # worker shutting down
+            yield f"event: {change['action']}\ndata: {json.dumps(change)}\n\n"
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+@router.get("/{user_id}")
+async def stream_events(user_id: UUID, request: Request):
+    """Server-sent events stream of a user's log, task and interview changes
+
+    Each event is named created/updated/deleted with a JSON body of
+    {user_id, table, action, id}. A "resync" event means changes may have
+    been missed; clients should catch up via /sync.
+    """
+    return StreamingResponse(
+        event_stream(request, str(user_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -4,21 +4,32 @@ from typing import List, Optional
 from uuid import UUID
 
 from database import get_db
+from ratelimit import rate_limit
+from idempotency import IdempotentRequest, idempotency_key
 from models import Interview
 from schemas import InterviewCreate, InterviewUpdate, InterviewResponse
 
 router = APIRouter(prefix="/interviews", tags=["Interviews"])
 
 @router.post("/", response_model=InterviewResponse)
-def create_interview(interview: InterviewCreate, db: Session = Depends(get_db)):
-    """Create a new interview tracking entry"""
+def create_interview(
+    interview: InterviewCreate,
+    db: Session = Depends(get_db),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    """Create a new interview tracking entry (supports Idempotency-Key)"""
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     new_interview = Interview(**interview.model_dump())
     db.add(new_interview)
+    db.flush()
+    response = InterviewResponse.model_validate(new_interview)
+    idempotency.save(response)
     db.commit()
-    db.refresh(new_interview)
-    return new_interview
+    return response
 
-@router.get("/", response_model=List[InterviewResponse])
+@router.get("/", response_model=List[InterviewResponse], dependencies=[Depends(rate_limit("bulk"))])
 def get_all_interviews(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all interviews"""
     interviews = db.query(Interview).offset(skip).limit(limit).all()
@@ -1,38 +1,73 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import any_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert
 from typing import List
 from uuid import UUID
 from datetime import date, datetime
+from psycopg2 import errorcodes
 
 from database import get_db
-from models import DailyLog, RoutineTask
+from ratelimit import rate_limit
+from idempotency import IdempotentRequest, idempotency_key
+from notifications import notify_change
+from models import DailyLog, RoutineTask, runs_on
 from schemas import DailyLogCreate, DailyLogUpdate, DailyLogResponse
+from routers.analytics import invalidate_heatmap
 
 router = APIRouter(prefix="/logs", tags=["Daily Logs"])
 
+# UNIQUE(user_id, routine_task_id, date) from migration 001
+DAILY_LOG_UNIQUE = "daily_logs_user_id_routine_task_id_date_key"
+
 @router.post("/", response_model=DailyLogResponse)
-def create_daily_log(entry: DailyLogCreate, db: Session = Depends(get_db)):
-    """Create a new daily log entry for a habit"""
+def create_daily_log(
+    entry: DailyLogCreate,
+    db: Session = Depends(get_db),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    """Create a new daily log entry for a habit (supports Idempotency-Key)"""
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     log = DailyLog(**entry.model_dump())
     db.add(log)
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        # Anything else (e.g. an unknown user or routine task) is not a duplicate
+        if e.orig.pgcode == errorcodes.UNIQUE_VIOLATION and e.orig.diag.constraint_name == DAILY_LOG_UNIQUE:
+            raise HTTPException(status_code=409, detail="A log already exists for this routine task and date")
+        raise
+
+    response = DailyLogResponse.model_validate(log)
+    idempotency.save(response)
+    invalidate_heatmap(db, entry.user_id, entry.date.year)
     db.commit()
-    db.refresh(log)
-    return log
+    return response
 
-@router.get("/", response_model=List[DailyLogResponse])
+@router.get("/", response_model=List[DailyLogResponse], dependencies=[Depends(rate_limit("bulk"))])
 def get_all_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all daily logs"""
     logs = db.query(DailyLog).offset(skip).limit(limit).all()
     return logs
 
-@router.get("/user/{user_id}", response_model=List[DailyLogResponse])
+@router.get("/user/{user_id}", response_model=List[DailyLogResponse], dependencies=[Depends(rate_limit("bulk"))])
 def get_logs_by_user(user_id: UUID, db: Session = Depends(get_db)):
     """Get all daily logs for a specific user"""
     logs = db.query(DailyLog).filter(DailyLog.user_id == user_id).all()
     return logs
 
-@router.get("/routine-task/{routine_task_id}", response_model=List[DailyLogResponse])
+def routine_task_owner(db: Session, path_params: dict):
+    """User to charge for /routine-task/{id}; runs before the id is validated"""
+    try:
+        routine_task_id = UUID(path_params["routine_task_id"])
+    except ValueError:
+        return None
+    return db.query(RoutineTask.user_id).filter(RoutineTask.id == routine_task_id).scalar()
+
+@router.get("/routine-task/{routine_task_id}", response_model=List[DailyLogResponse], dependencies=[Depends(rate_limit("bulk", owner=routine_task_owner))])
 def get_logs_by_routine_task(routine_task_id: UUID, db: Session = Depends(get_db)):
     """Get all daily logs for a specific routine task"""
     logs = db.query(DailyLog).filter(DailyLog.routine_task_id == routine_task_id).all()
@@ -66,6 +101,7 @@ def update_daily_log(log_id: UUID, log_update: DailyLogUpdate, db: Session = Dep
     for key, value in update_data.items():
         setattr(log, key, value)
 
+    invalidate_heatmap(db, log.user_id, log.date.year)
     db.commit()
 
     # Return log with routine_task relationship loaded
@@ -75,56 +111,66 @@ def update_daily_log(log_id: UUID, log_update: DailyLogUpdate, db: Session = Dep
     return updated_log
 
 @router.post("/generate-today/{user_id}", response_model=List[DailyLogResponse])
-def generate_today_logs(user_id: UUID, db: Session = Depends(get_db)):
+def generate_today_logs(
+    user_id: UUID,
+    db: Session = Depends(get_db),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
     """Auto-generate today's daily logs based on routine tasks for today's day
 
     This creates log entries with status='pending' for all routine tasks
     that have today's day in their active_days array and don't already have logs.
+    Supports Idempotency-Key: a retried request gets the original list back.
     """
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     today = date.today()
     day_name = today.strftime('%A')  # e.g., 'Monday', 'Tuesday'
 
     # Get all routine tasks for this day
     routine_tasks = db.query(RoutineTask).filter(
         RoutineTask.user_id == user_id,
-        day_name == any_(RoutineTask.active_days)
+        runs_on(day_name)
     ).all()
 
     if not routine_tasks:
         return []
 
-    # Get existing logs for today
-    existing_logs = db.query(DailyLog).filter(
-        DailyLog.user_id == user_id,
-        DailyLog.date == today
-    ).all()
-
-    # Get routine_task_ids that already have logs
-    existing_task_ids = {log.routine_task_id for log in existing_logs}
-
-    # Create logs only for tasks that don't have logs yet
-    created_logs = []
-    for task in routine_tasks:
-        if task.id not in existing_task_ids:
-            log = DailyLog(
-                user_id=user_id,
-                routine_task_id=task.id,
-                date=today,
-                status='pending',
-                actual_minutes=0,
-                notes=None
-            )
-            db.add(log)
-            created_logs.append(log)
-
-    if created_logs:
-        db.commit()
-        # Refresh logs with the routine_task relationship loaded
-        log_ids = [log.id for log in created_logs]
+    # Tasks that already have a log today are skipped by the unique
+    # (user_id, routine_task_id, date) constraint, which also settles
+    # concurrent calls: each log is created, and returned, exactly once
+    created_ids = db.execute(
+        insert(DailyLog)
+        .values([
+            {
+                "user_id": user_id,
+                "routine_task_id": task.id,
+                "date": today,
+                "status": 'pending',
+                "actual_minutes": 0,
+                "notes": None
+            }
+            for task in routine_tasks
+        ])
+        .on_conflict_do_nothing(index_elements=["user_id", "routine_task_id", "date"])
+        .returning(DailyLog.id)
+    ).scalars().all()
+
+    if created_ids:
+        # Core INSERT skips the ORM flush hook, so publish these explicitly
+        for log_id in created_ids:
+            notify_change(db, {"user_id": str(user_id), "table": "daily_logs", "action": "created", "id": str(log_id)})
+
+        # Reload logs with the routine_task relationship loaded
         refreshed_logs = db.query(DailyLog).options(joinedload(DailyLog.routine_task)).filter(
-            DailyLog.id.in_(log_ids)
+            DailyLog.id.in_(created_ids)
         ).all()
-        return refreshed_logs
+        response = [DailyLogResponse.model_validate(log) for log in refreshed_logs]
+        idempotency.save(response)
+        invalidate_heatmap(db, user_id, today.year)
+        db.commit()
+        return response
 
     # If no new logs were created, return empty list
     return []
@@ -135,6 +181,7 @@ def delete_log(log_id: UUID, db: Session = Depends(get_db)):
     log = db.query(DailyLog).filter(DailyLog.id == log_id).first()
     if not log:
         raise HTTPException(status_code=404, detail="Daily log not found")
+    invalidate_heatmap(db, log.user_id, log.date.year)
     db.delete(log)
     db.commit()
     return {"message": "Daily log deleted successfully"}
\ No newline at end of file
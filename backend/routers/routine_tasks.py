@@ -1,25 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import any_
 from typing import List
 from uuid import UUID
 
+from archive import purge_routine_task
 from database import get_db
-from models import RoutineTask
+from ratelimit import rate_limit
+from idempotency import IdempotentRequest, idempotency_key
+from models import RoutineTask, WEEKDAYS, runs_on
 from schemas import RoutineTaskCreate, RoutineTaskUpdate, RoutineTaskResponse
+from routers.analytics import invalidate_heatmap
 
 router = APIRouter(prefix="/routine-tasks", tags=["Routine Tasks"])
 
 @router.post("/", response_model=RoutineTaskResponse)
-def create_routine_task(task: RoutineTaskCreate, db: Session = Depends(get_db)):
-    """Create a new routine task"""
+def create_routine_task(
+    task: RoutineTaskCreate,
+    db: Session = Depends(get_db),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    """Create a new routine task (supports Idempotency-Key)"""
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     new_task = RoutineTask(**task.model_dump())
     db.add(new_task)
+    db.flush()
+    response = RoutineTaskResponse.model_validate(new_task)
+    idempotency.save(response)
     db.commit()
-    db.refresh(new_task)
-    return new_task
+    return response
 
-@router.get("/", response_model=List[RoutineTaskResponse])
+@router.get("/", response_model=List[RoutineTaskResponse], dependencies=[Depends(rate_limit("bulk"))])
 def get_all_routine_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all routine tasks"""
     tasks = db.query(RoutineTask).offset(skip).limit(limit).all()
@@ -38,13 +50,12 @@ def get_routine_tasks_by_day(user_id: UUID, day_name: str, db: Session = Depends
     day_name should be: Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday
     """
     # Validate day name
-    valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    if day_name not in valid_days:
-        raise HTTPException(status_code=400, detail=f"Invalid day name. Must be one of: {', '.join(valid_days)}")
+    if day_name not in WEEKDAYS:
+        raise HTTPException(status_code=400, detail=f"Invalid day name. Must be one of: {', '.join(WEEKDAYS)}")
 
     tasks = db.query(RoutineTask).filter(
         RoutineTask.user_id == user_id,
-        day_name == any_(RoutineTask.active_days)
+        runs_on(day_name)
     ).all()
     return tasks
 
@@ -77,6 +88,10 @@ def delete_routine_task(task_id: UUID, db: Session = Depends(get_db)):
     task = db.query(RoutineTask).filter(RoutineTask.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Routine task not found")
+    # The cascade can remove logs from any year, and archived months
+    # are rebuilt without the task
+    invalidate_heatmap(db, task.user_id)
+    purge_routine_task(db, task.user_id, task.id)
     db.delete(task)
     db.commit()
     return {"message": "Routine task deleted successfully"}
@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.orm import Session, noload
+from uuid import UUID
+import os
+import time
+
+from database import engine, get_db
+from ratelimit import rate_limit
+from models import RoutineTask, DailyLog, Interview, UserGoal, SyncTombstone, SyncState
+from schemas import SyncResponse
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+SYNCED_MODELS = {
+    "routine_tasks": RoutineTask,
+    "daily_logs": DailyLog,
+    "interviews": Interview,
+    "user_goals": UserGoal,
+}
+
+# Tombstones older than this are pruned; clients that last synced before
+# then are told to start over with since=0
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+PRUNED_THROUGH = "tombstones_pruned_through"
+
+# Pruning is run by whichever request first notices this has elapsed
+PRUNE_INTERVAL_SECONDS = 600
+_last_prune = 0.0
+
+def prune_tombstones():
+    """Delete expired tombstones and record the highest change_seq removed"""
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return
+    _last_prune = now
+    with engine.begin() as conn:
+        conn.execute(text("""
+            WITH pruned AS (
+                DELETE FROM sync_tombstones
+                WHERE deleted_at < NOW() - make_interval(days => :days)
+                RETURNING change_seq
+            )
+            INSERT INTO sync_state (name, value)
+            SELECT :name, max(change_seq) FROM pruned HAVING count(*) > 0
+            ON CONFLICT (name) DO UPDATE SET value = GREATEST(sync_state.value, EXCLUDED.value)
+        """), {"days": SYNC_TOMBSTONE_RETENTION_DAYS, "name": PRUNED_THROUGH})
+
+@router.get("/{user_id}", response_model=SyncResponse, dependencies=[Depends(rate_limit("bulk"))])
+def get_changes(
+    user_id: UUID,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """Get rows created, updated or deleted since a sync token
+
+    Start with since=0 for a full download, then keep passing back the
+    returned token. Every write takes the next value of the global change
+    sequence, so anything with change_seq > since is new to the client.
+    At most `limit` rows are returned per collection; when has_more is
+    true, call again straight away with the new token.
+
+    Deletions are kept for SYNC_TOMBSTONE_RETENTION_DAYS. A token older than
+    that gets 410 Gone; the client should discard its copy and resync from 0.
+    Logs moved out by archive.py are not reported as deleted (see README).
+    """
+    prune_tombstones()
+
+    # One snapshot for every query below, so no collection sees a commit the others missed
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    pruned_through = db.query(SyncState.value).filter(SyncState.name == PRUNED_THROUGH).scalar() or 0
+    if 0 < since < pruned_through:
+        raise HTTPException(status_code=410, detail="Sync token too old, resync with since=0")
+
+    changes = {}
+    for name, model in SYNCED_MODELS.items():
+        query = db.query(model).filter(model.user_id == user_id, model.change_seq > since)
+        if model is DailyLog:
+            query = query.options(noload(DailyLog.routine_task))
+        changes[name] = query.order_by(model.change_seq).limit(limit).all()
+
+    changes["deleted"] = db.query(SyncTombstone).filter(
+        SyncTombstone.user_id == user_id,
+        SyncTombstone.change_seq > since
+    ).order_by(SyncTombstone.change_seq).limit(limit).all()
+
+    # If any collection was truncated, only hand out changes up to the point
+    # every collection is complete, so the next call can't skip anything.
+    truncated = [rows[-1].change_seq for rows in changes.values() if len(rows) == limit]
+    cutoff = min(truncated) if truncated else None
+    if cutoff is not None:
+        for name, rows in changes.items():
+            changes[name] = [row for row in rows if row.change_seq <= cutoff]
+
+    token = max((rows[-1].change_seq for rows in changes.values() if rows), default=since)
+    if cutoff is None:
+        # Nothing older than the pruning horizon is missing, so a fresh resync
+        # can start there instead of being rejected on its next call
+        token = max(token, pruned_through)
+
+    return {
+        "token": token,
+        "has_more": cutoff is not None,
+        "routine_tasks": changes["routine_tasks"],
+        "daily_logs": changes["daily_logs"],
+        "interviews": changes["interviews"],
+        "user_goals": changes["user_goals"],
+        "deleted": [{"table": row.table_name, "id": row.row_id} for row in changes["deleted"]]
+    }
@@ -1,35 +1,99 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Optional
 from uuid import UUID
 
+from cache import TTLCache, MISSING
 from database import get_db
+from notifications import invalidate_cache, register_cache
+from ratelimit import rate_limit
+from idempotency import IdempotentRequest, idempotency_key
 from models import User
 from schemas import UserCreate, UserResponse
+from routers.analytics import invalidate_heatmap
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# id/email records keyed by ("id", user_id) and ("email", email). Misses are
+# cached too (as None) but only briefly. Creates and deletes drop both keys
+# in every worker (see forget_user).
+USER_CACHE_TTL = 300
+USER_CACHE_MISS_TTL = 30
+user_cache = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL)
+
+def cache_user(record: dict):
+    user_cache.set(("id", record["id"]), record)
+    user_cache.set(("email", record["email"]), record)
+
+def drop_user(user_id: str, email: str):
+    user_cache.pop(("id", UUID(user_id)))
+    user_cache.pop(("email", email))
+
+register_cache("users", drop_user, user_cache.clear)
+
+def forget_user(db: Session, user_id: UUID, email: str):
+    """Drop a user's cached records (and cached misses) in every worker once db commits"""
+    invalidate_cache(db, "users", str(user_id), email)
+
+def lookup_user(db: Session, key: str, value) -> Optional[dict]:
+    """Fetch a user's id/email record by id or email, going through the cache"""
+    record = user_cache.get((key, value))
+    if record is not MISSING:
+        return record
+
+    column = User.id if key == "id" else User.email
+    row = db.query(User.id, User.email).filter(column == value).first()
+    if row is None:
+        user_cache.set((key, value), None, ttl=USER_CACHE_MISS_TTL)
+        return None
+
+    record = {"id": row.id, "email": row.email}
+    cache_user(record)
+    return record
+
 @router.post("/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    """Create a new user"""
-    # If id is provided (from Supabase auth), check if user exists by id
-    if user.id:
-        existing_user = db.query(User).filter(User.id == user.id).first()
-        if existing_user:
-            return existing_user  # User already exists, return it
-
-    # Check if user with this email already exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    new_user = User(**user.model_dump(exclude_none=True))
-    db.add(new_user)
+def create_user(
+    user: UserCreate,
+    db: Session = Depends(get_db),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    """Create a new user, or return it if this Supabase id is already synced
+
+    Supports Idempotency-Key.
+    """
+    if idempotency.replay is not None:
+        return idempotency.replay
+
+    # Single round-trip insert; a conflict on id or email returns no row
+    row = db.execute(
+        insert(User)
+        .values(**user.model_dump(exclude_none=True))
+        .on_conflict_do_nothing()
+        .returning(User.id, User.email)
+    ).first()
+
+    if row is not None:
+        # Other workers may still hold a cached miss for this id or email
+        forget_user(db, row.id, row.email)
+    else:
+        conditions = [User.email == user.email]
+        if user.id:
+            conditions.append(User.id == user.id)
+        existing = db.query(User.id, User.email).filter(or_(*conditions)).all()
+        match = next((u for u in existing if user.id and u.id == user.id), None)
+        if match is None:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        row = match
+
+    record = {"id": row.id, "email": row.email}
+    idempotency.save(record)
     db.commit()
-    db.refresh(new_user)
-    return new_user
+    cache_user(record)
+    return record
 
-@router.get("/", response_model=List[UserResponse])
+@router.get("/", response_model=List[UserResponse], dependencies=[Depends(rate_limit("bulk"))])
 def get_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all users"""
     users = db.query(User).offset(skip).limit(limit).all()
@@ -38,7 +102,7 @@ def get_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(user_id: UUID, db: Session = Depends(get_db)):
     """Get a specific user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = lookup_user(db, "id", user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -46,7 +110,7 @@ def get_user(user_id: UUID, db: Session = Depends(get_db)):
 @router.get("/email/{email}", response_model=UserResponse)
 def get_user_by_email(email: str, db: Session = Depends(get_db)):
     """Get a specific user by email"""
-    user = db.query(User).filter(User.email == email).first()
+    user = lookup_user(db, "email", email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -57,6 +121,8 @@ def delete_user(user_id: UUID, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_heatmap(db, user_id)
+    forget_user(db, user_id, user.email)
     db.delete(user)
     db.commit()
     return {"message": "User deleted successfully"}
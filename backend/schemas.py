@@ -136,4 +136,20 @@ class UserGoalResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# ============================================================================
+# Sync Schemas
+# ============================================================================
+class SyncDeletion(BaseModel):
+    table: str
+    id: UUID
+
+class SyncResponse(BaseModel):
+    token: int  # pass back as ?since= on the next call
+    has_more: bool  # true if another call with the new token returns more changes
+    routine_tasks: List[RoutineTaskResponse]
+    daily_logs: List[DailyLogResponse]
+    interviews: List[InterviewResponse]
+    user_goals: List[UserGoalResponse]
+    deleted: List[SyncDeletion]
@@ -0,0 +1,58 @@
+"""gunicorn worker class for the production profile (see gunicorn.conf.py)"""
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+import sys
+import time
+
+class StreamingServer(Server):
+    """uvicorn Server that ends /events streams as soon as shutdown starts
+
+    Otherwise open streams keep their connections busy until the graceful
+    shutdown timeout cancels them.
+    """
+
+    async def shutdown(self, sockets=None):
+        from notifications import hub
+        hub.shutdown()
+        await super().shutdown(sockets=sockets)
+
+class GracefulUvicornWorker(UvicornWorker):
+    """UvicornWorker that drains within gunicorn's graceful_timeout
+
+    UvicornWorker leaves uvicorn's timeout_graceful_shutdown unset, so a
+    worker exiting after max_requests would wait forever for long-lived
+    connections, stop heartbeating, and get SIGABRT from the arbiter.
+    Also logs when each worker answers its first request (forked_at is set
+    by the post_fork hook).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = self.cfg.graceful_timeout
+
+    def first_request_logger(self, app):
+        answered = False
+
+        async def wrapped(scope, receive, send):
+            nonlocal answered
+            try:
+                await app(scope, receive, send)
+            finally:
+                if not answered and scope["type"] == "http":
+                    answered = True
+                    self.log.info(
+                        "Worker %s answered its first request %.3fs after fork",
+                        self.pid, time.perf_counter() - self.forked_at
+                    )
+
+        return wrapped
+
+    async def _serve(self):
+        # Same as UvicornWorker._serve, with StreamingServer and the logger
+        self.config.app = self.first_request_logger(self.wsgi)
+        server = StreamingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -9,6 +9,25 @@ const api = axios.create({
   },
 });
 
+// Idempotency-Key for create/batch calls. If the connection drops before a
+// response arrives, the interceptor below resends the same config (and key),
+// so the server replays the first response instead of writing twice.
+const idempotent = () => ({ headers: { 'Idempotency-Key': crypto.randomUUID() } });
+
+const MAX_RETRIES = 3;
+
+api.interceptors.response.use(undefined, async (error) => {
+  const config = error.config;
+  const retries = config?.retryCount ?? 0;
+  // Only network failures: an HTTP error response means the server already answered
+  if (error.response || axios.isCancel(error) || !config?.headers?.['Idempotency-Key'] || retries >= MAX_RETRIES) {
+    return Promise.reject(error);
+  }
+  config.retryCount = retries + 1;
+  await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** retries));
+  return api(config);
+});
+
 // ============================================================================
 // Users API
 // ============================================================================
@@ -37,7 +56,7 @@ export const routineTasksAPI = {
   getByUserAndDay: (userId, dayName) => api.get(`/routine-tasks/user/${userId}/day/${dayName}`),
 
   // Create new routine task
-  create: (taskData) => api.post('/routine-tasks/', taskData),
+  create: (taskData) => api.post('/routine-tasks/', taskData, idempotent()),
 
   // Update routine task
   update: (id, taskData) => api.put(`/routine-tasks/${id}`, taskData),
@@ -66,13 +85,13 @@ export const logsAPI = {
   getByUserAndDate: (userId, date) => api.get(`/logs/user/${userId}/date/${date}`),
 
   // Create new log
-  create: (logData) => api.post('/logs/', logData),
+  create: (logData) => api.post('/logs/', logData, idempotent()),
 
   // Update log (status, actual_minutes, notes)
   update: (id, logData) => api.put(`/logs/${id}`, logData),
 
   // Auto-generate today's logs based on routine tasks
-  generateToday: (userId) => api.post(`/logs/generate-today/${userId}`),
+  generateToday: (userId) => api.post(`/logs/generate-today/${userId}`, null, idempotent()),
 
   // Delete log
   delete: (id) => api.delete(`/logs/${id}`),
@@ -98,7 +117,7 @@ export const interviewsAPI = {
   },
 
   // Create new interview
-  create: (interviewData) => api.post('/interviews/', interviewData),
+  create: (interviewData) => api.post('/interviews/', interviewData, idempotent()),
 
   // Update interview
   update: (id, interviewData) => api.put(`/interviews/${id}`, interviewData),
@@ -119,6 +138,17 @@ export const analyticsAPI = {
 
   // Get current streak
   getStreak: (userId) => api.get(`/analytics/streak/${userId}`),
+
+  // Get year heatmap (start date + per-day completion levels)
+  getHeatmap: (userId, year) => api.get(`/analytics/heatmap/${userId}${year ? '?year=' + year : ''}`),
+};
+
+// ============================================================================
+// Sync API
+// ============================================================================
+export const syncAPI = {
+  // Get rows changed/deleted since a token (start with 0, then pass back data.token)
+  getChanges: (userId, since = 0) => api.get(`/sync/${userId}?since=${since}`),
 };
 
 export default api;